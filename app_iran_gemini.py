@@ -1,11 +1,12 @@
-import requests
-import yaml
-from urllib.parse import urlparse, parse_qs, unquote
 import sys
 import os
 
-os.makedirs("files", exist_ok=True)
+from nodes import dump_singbox, parse_vless, render_all
+from providers import use_providers, write_shards
+from publish import batch, publish, render_config
+
 OUTPUT_FILE = os.path.join("files", "clash_iran_gemini.yaml")
+SINGBOX_FILE = os.path.join("files", "singbox_iran_gemini.json")
 # ---------------------------------------------------------
 # Input Settings
 # ---------------------------------------------------------
@@ -99,165 +100,49 @@ BASE_CONFIG = {
     }
 }
 
-# ---------------------------------------------------------
-# Parsing Functions (VLESS Reality Logic)
-# ---------------------------------------------------------
-
-def build_transport(net_type, path, host, service_name, header_type):
-    transport = {}
-    if path and "?" in path:
-        path = path.split("?")[0]
-    if not path:
-        path = "/"
-
-    if net_type == 'tcp':
-        if header_type == 'http':
-            transport = {
-                "network": "http",
-                "http-opts": {
-                    "method": "GET",
-                    "path": [path],
-                    "headers": {"Host": [host]} if host else {}
-                }
-            }
-        else:
-            transport = {"network": "tcp"}
-
-    elif net_type == 'ws':
-        transport = {
-            "network": "ws",
-            "ws-opts": {
-                "path": path,
-                "headers": {"Host": host} if host else {}
-            }
-        }
-
-    elif net_type == 'grpc':
-        transport = {
-            "network": "grpc",
-            "grpc-opts": {
-                "grpc-service-name": service_name
-            }
-        }
-    return transport
-
-def build_tls(security, sni, fp, pbk, sid, alpn):
-    if security not in ["tls", "reality"]:
-        return {}
-
-    tls_config = {
-        "tls": True,
-        "servername": sni,
-        "client-fingerprint": "random" if fp == "randomized" else fp
-    }
-
-    if security == "tls":
-        if alpn:
-            tls_config["alpn"] = alpn.split(",")
-        tls_config["skip-cert-verify"] = True
-
-    elif security == "reality" and pbk and sid:
-        tls_config["reality-opts"] = {
-            "public-key": pbk,
-            "short-id": sid
-        }
-    
-    return tls_config
-
-def parse_vless_bpb_style(link):
-    if not link.startswith("vless://"):
-        return None
-
-    try:
-        parsed = urlparse(link)
-        params = parse_qs(parsed.query)
-        
-        # Extract base parameters
-        uuid = parsed.username
-        server = parsed.hostname
-        port = parsed.port
-        name = unquote(parsed.fragment) if parsed.fragment else "VLESS Node"
-        
-        # Extract query parameters
-        security = params.get("security", [""])[0]
-        net_type = params.get("type", ["tcp"])[0]
-        sni = params.get("sni", [""])[0] or server
-        pbk = params.get("pbk", [""])[0]
-        sid = params.get("sid", [""])[0]
-        fp = params.get("fp", ["chrome"])[0]
-        path = params.get("path", ["/"])[0]
-        host = params.get("host", [""])[0]
-        service_name = params.get("serviceName", [""])[0]
-        header_type = params.get("headerType", [""])[0]
-        flow = params.get("flow", [""])[0]
-        alpn = params.get("alpn", [""])[0]
-
-        # Build Transport and TLS objects
-        tls_settings = build_tls(security, sni, fp, pbk, sid, alpn)
-        transport_settings = build_transport(net_type, path, host, service_name, header_type)
-
-        # Base Proxy Object
-        proxy = {
-            "name": name,
-            "type": "vless",
-            "server": server,
-            "port": port,
-            "uuid": uuid,
-            "tfo": False,
-            "udp": True,
-            "ip-version": "ipv4-prefer",
-        }
-
-        if flow:
-            proxy["flow"] = flow
-
-        # Merge settings
-        proxy.update(tls_settings)
-        proxy.update(transport_settings)
-
-        # Remove None/Empty values
-        return {k: v for k, v in proxy.items() if v is not None}
-
-    except Exception as e:
-        return None
-
 # ---------------------------------------------------------
 # Main Execution
 # ---------------------------------------------------------
 
-if __name__ == "__main__":
-    print(f"Downloading links from: {SOURCE_URL}")
-    try:
-        response = requests.get(SOURCE_URL, timeout=15)
-        response.raise_for_status()
-        links = response.text.splitlines()
-    except Exception as e:
-        print(f"Failed to download: {e}")
-        exit(1)
+def main(providers=False, links=None, singbox=False):
+    if links is None:
+        import requests
 
-    proxies = []
+        print(f"Downloading links from: {SOURCE_URL}")
+        try:
+            response = requests.get(SOURCE_URL, timeout=15)
+            response.raise_for_status()
+            links = response.text.splitlines()
+        except Exception as e:
+            print(f"Failed to download: {e}")
+            sys.exit(1)
+
+    nodes = []
     name_counter = {}  # To handle duplicate proxy names
 
     print("Processing links...")
     for link in links:
         if link.strip():
-            p = parse_vless_bpb_style(link.strip())
-            if p:
-                original_name = p["name"]
+            node = parse_vless(link)
+            if node:
+                original_name = node.name or "VLESS Node"
                 
                 # Check for duplicates and rename if necessary
                 if original_name in name_counter:
                     name_counter[original_name] += 1
-                    new_name = f"{original_name}_{name_counter[original_name]}"
-                    p["name"] = new_name
+                    node = node.renamed(f"{original_name}_{name_counter[original_name]}")
                 else:
                     name_counter[original_name] = 1
+                    node = node.renamed(original_name)
                 
-                proxies.append(p)
+                nodes.append(node)
 
-    print(f"Parsed {len(proxies)} proxies.")
+    print(f"Parsed {len(nodes)} proxies.")
 
-    if proxies:
+    if nodes:
+        proxies = render_all(nodes, "clash", insecure=True)  # TLS nodes skip certificate checks
+        for p in proxies:
+            p["ip-version"] = "ipv4-prefer"  # IPv6 is disabled for stability in Iran
         proxy_names = [p["name"] for p in proxies]
         
         # Proxy Groups definition (Emojis here are safe for file writing)
@@ -298,16 +183,29 @@ if __name__ == "__main__":
 
         # Assemble Final Config
         final_config = BASE_CONFIG.copy()
-        final_config["proxies"] = proxies
+        if providers:
+            final_config["proxy-providers"] = write_shards(proxies, "gemini", OUTPUT_FILE)
+            use_providers(proxy_groups, proxy_names, final_config["proxy-providers"])
+        else:
+            final_config["proxies"] = proxies
         final_config["proxy-groups"] = proxy_groups
         final_config["rules"] = rules
 
         # Write to file (Using UTF-8 encoding handles emojis correctly)
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            yaml.dump(final_config, f, allow_unicode=True, sort_keys=False)
-        
+        outputs = {OUTPUT_FILE: render_config(final_config, allow_unicode=True)}
+        if singbox:
+            outputs[SINGBOX_FILE] = dump_singbox(nodes, insecure=True)
+
         # Use simple text for console output to avoid Windows Unicode errors
-        print(f"[SUCCESS] Configuration saved as: {OUTPUT_FILE}")
-        print("Features: proxy-server-nameserver added, Duplicate names fixed, Iran traffic bypassed.")
+        messages = [f"[SUCCESS] Configuration saved as: {OUTPUT_FILE}"]
+        if singbox:
+            messages.append(f"[SUCCESS] sing-box configuration saved as: {SINGBOX_FILE}")
+        messages.append("Features: proxy-server-nameserver added, Duplicate names fixed, Iran traffic bypassed.")
+        publish(outputs, messages=messages)
     else:
-        print("[ERROR] No valid proxies found.")
\ No newline at end of file
+        print("[ERROR] No valid proxies found.")
+
+
+if __name__ == "__main__":
+    with batch():
+        main(providers="--providers" in sys.argv[1:], singbox="--singbox" in sys.argv[1:])
\ No newline at end of file
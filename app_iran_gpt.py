@@ -1,10 +1,12 @@
-import requests
-import yaml
-from urllib.parse import urlparse, parse_qs, unquote
 import os
+import sys
+
+from nodes import dump_singbox, parse_vless as parse_vless_node, render_all
+from providers import use_providers, write_shards
+from publish import batch, publish, render_config
 
-os.makedirs("files", exist_ok=True)
 OUTPUT_FILE = os.path.join("files", "clash_iran_gpt.yaml")
+SINGBOX_FILE = os.path.join("files", "singbox_iran_gpt.json")
 
 SOURCE_URL = "https://raw.githubusercontent.com/x45fh56/tgs/refs/heads/main/Servers/Protocols/Categorized_Servers/1_VLESS_REALITY_TCP.txt"
 
@@ -23,78 +25,36 @@ def make_unique(name, existing_names):
 
 def parse_vless(link, existing_names):
     """
-    Parse a VLESS link and convert it into Clash Meta proxy format
+    Parse a VLESS link into a node with a unique name
     """
-    link = link.strip()
-    if not link.startswith("vless://"):
-        return None
-
-    parsed = urlparse(link)
-
-    uuid_value = parsed.username
-    server = parsed.hostname
-    port = parsed.port
-
-    if not server or not port or not uuid_value:
+    node = parse_vless_node(link)
+    if not node:
         return None
 
-    params = parse_qs(parsed.query)
-
-    # Extract parameters
-    security = params.get("security", ["none"])[0]
-    sni = params.get("sni", [server])[0]
-    fingerprint = params.get("fp", ["chrome"])[0]
-    public_key = params.get("pbk", [None])[0]
-    short_id = params.get("sid", [None])[0]
-    flow = params.get("flow", [""])[0]
-
     # Generate proxy name
-    remark = unquote(parsed.fragment) if parsed.fragment else f"{server}:{port}"
-    remark = make_unique(remark, existing_names)
-
-    # Build base proxy structure
-    proxy = {
-        "name": remark,
-        "type": "vless",
-        "server": server,
-        "port": port,
-        "uuid": uuid_value,
-        "network": "tcp",
-        "udp": True,
-        "tls": security in ["tls", "reality"],
-        "servername": sni,
-        "client-fingerprint": fingerprint,
-        "skip-cert-verify": False
-    }
-
-    if flow:
-        proxy["flow"] = flow
+    remark = node.name or f"{node.server}:{node.port}"
+    return node.renamed(make_unique(remark, existing_names))
 
-    # Add Reality options if applicable
-    if security == "reality" and public_key and short_id:
-        proxy["reality-opts"] = {
-            "public-key": public_key,
-            "short-id": short_id
-        }
 
-    return proxy
+def main(providers=False, lines=None, singbox=False):
+    if lines is None:
+        import requests
 
+        print("Downloading VLESS servers...")
 
-def main():
-    print("Downloading VLESS servers...")
+        response = requests.get(SOURCE_URL, timeout=15)
+        lines = response.text.splitlines()
 
-    response = requests.get(SOURCE_URL, timeout=15)
-    lines = response.text.splitlines()
-
-    proxies = []
+    nodes = []
     existing_names = set()
 
     for line in lines:
-        proxy = parse_vless(line, existing_names)
-        if proxy:
-            existing_names.add(proxy["name"])
-            proxies.append(proxy)
+        node = parse_vless(line, existing_names)
+        if node:
+            existing_names.add(node.name)
+            nodes.append(node)
 
+    proxies = render_all(nodes, "clash")
     print(f"Parsed {len(proxies)} proxies.")
 
     # Build optimized Clash config for Iran
@@ -164,12 +124,21 @@ def main():
         ]
     }
 
-    # Save YAML output
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        yaml.dump(config, f, allow_unicode=True, sort_keys=False)
+    if providers:
+        proxy_names = [p["name"] for p in proxies]
+        config["proxy-providers"] = write_shards(config.pop("proxies"), "gpt", OUTPUT_FILE)
+        use_providers(config["proxy-groups"], proxy_names, config["proxy-providers"])
 
-    print(f"Config successfully saved as {OUTPUT_FILE}")
+    # Save YAML output
+    outputs = {OUTPUT_FILE: render_config(config, allow_unicode=True)}
+    if singbox:
+        outputs[SINGBOX_FILE] = dump_singbox(nodes)
+    messages = [f"Config successfully saved as {OUTPUT_FILE}"]
+    if singbox:
+        messages.append(f"sing-box config successfully saved as {SINGBOX_FILE}")
+    publish(outputs, messages=messages)
 
 
 if __name__ == "__main__":
-    main()
+    with batch():
+        main(providers="--providers" in sys.argv[1:], singbox="--singbox" in sys.argv[1:])
\ No newline at end of file
@@ -1,13 +1,14 @@
-import urllib.request
-import urllib.parse
 import uuid
-import yaml
 from typing import Dict, Optional, List
 import sys
 import os
 
-os.makedirs("files", exist_ok=True)
+from nodes import Node, dump_singbox, parse_vless, render_all
+from providers import use_providers, write_shards
+from publish import batch, publish, render_config
+
 OUTPUT_FILE = os.path.join("files", "clash_iran_grok.yaml")
+SINGBOX_FILE = os.path.join("files", "singbox_iran_grok.json")
 # Force UTF-8 output for console (especially useful on Windows)
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")  # type: ignore
@@ -22,58 +23,19 @@ LOG_LEVEL = "info"
 MODE = "rule"
 EXTERNAL_CONTROLLER = "127.0.0.1:9090"
 
-def parse_vless_url(line: str) -> Optional[Dict]:
+def parse_vless_url(line: str) -> Optional[Node]:
     line = line.strip()
     if not line.startswith("vless://") or "#" not in line:
         return None
 
-    try:
-        url_part, remark_part = line.split("#", 1)
-        remark = urllib.parse.unquote(remark_part.strip()) if remark_part.strip() else f"Reality-{uuid.uuid4().hex[:6]}"
-
-        parsed = urllib.parse.urlparse(url_part)
-        uuid_and_host = parsed.netloc
-        uuid_val, host_port = uuid_and_host.split("@", 1)
-        server, port_str = host_port.rsplit(":", 1)
-        port = int(port_str)
-
-        params = urllib.parse.parse_qs(parsed.query)
-
-        security = params.get("security", [""])[0]
-        if security != "reality":
-            return None
-
-        pbk = params.get("pbk", [None])[0]
-        sid = params.get("sid", [""])[0]
-        sni = params.get("sni", [""])[0]
-        fp = params.get("fp", ["chrome"])[0]
-        flow = params.get("flow", [None])[0]
-        spx = params.get("spx", [None])[0]
-
-        if not pbk or not sni:
-            return None
-
-        return {
-            "name": remark,
-            "server": server,
-            "port": port,
-            "uuid": uuid_val,
-            "flow": flow,
-            "tls": True,
-            "udp": True,
-            "network": "tcp",
-            "servername": sni,
-            "client-fingerprint": fp,
-            "reality-opts": {
-                "public-key": pbk,
-                "short-id": sid
-            },
-            "spiderX": spx if spx else None
-        }
-    except Exception as e:
-        print(f"Parse error: {line[:60]}... → {e}")
+    node = parse_vless(line)
+    if not node or node.security != "reality" or not node.public_key or not node.sni:
         return None
 
+    if not node.name:
+        node = node.renamed(f"Reality-{uuid.uuid4().hex[:6]}")
+    return node
+
 
 def build_dns() -> Dict:
     return {
@@ -152,34 +114,37 @@ def build_sniffer() -> Dict:
     }
 
 
-def main():
-    print("Downloading server list...")
-    try:
-        with urllib.request.urlopen(SOURCE_URL) as response:
-            text = response.read().decode("utf-8")
-    except Exception as e:
-        print(f"Download failed: {e}")
-        return
+def main(providers: bool = False, lines: Optional[List[str]] = None, singbox: bool = False):
+    if lines is None:
+        import urllib.request
+
+        print("Downloading server list...")
+        try:
+            with urllib.request.urlopen(SOURCE_URL) as response:
+                lines = response.read().decode("utf-8").splitlines()
+        except Exception as e:
+            print(f"Download failed: {e}")
+            return
 
-    proxies: List[Dict] = []
-    for line in text.splitlines():
-        proxy = parse_vless_url(line)
-        if proxy:
-            proxies.append(proxy)
+    nodes: List[Node] = []
+    for line in lines:
+        node = parse_vless_url(line)
+        if node:
+            nodes.append(node)
 
-    if not proxies:
+    if not nodes:
         print("No valid VLESS Reality servers found.")
         return
 
-    print(f"Found {len(proxies)} servers.")
+    print(f"Found {len(nodes)} servers.")
 
     # Fix duplicate names
     proxy_names = []
     seen = set()
     name_counters = {}
 
-    for p in proxies:
-        base_name = p["name"]
+    for i, node in enumerate(nodes):
+        base_name = node.name
         if base_name in name_counters:
             name_counters[base_name] += 1
             new_name = f"{base_name} - {name_counters[base_name]}"
@@ -190,7 +155,7 @@ def main():
         while new_name in seen:
             new_name = f"{new_name} ~{uuid.uuid4().hex[:4]}"
 
-        p["name"] = new_name
+        nodes[i] = node.renamed(new_name)
         seen.add(new_name)
         proxy_names.append(new_name)
 
@@ -210,7 +175,7 @@ def main():
         "dns": build_dns(),
         "tun": build_tun(),
         "sniffer": build_sniffer(),
-        "proxies": [],
+        "proxies": render_all(nodes, "clash"),
         "proxy-groups": [
             {
                 "name": "🚀 Main Select",
@@ -263,34 +228,31 @@ def main():
         ]
     }
 
-    for p in proxies:
-        entry = {
-            "name": p["name"],
-            "type": "vless",
-            "server": p["server"],
-            "port": p["port"],
-            "uuid": p["uuid"],
-            "network": "tcp",
-            "tls": True,
-            "udp": True,
-            "flow": p["flow"],
-            "servername": p["servername"],
-            "client-fingerprint": p["client-fingerprint"],
-            "reality-opts": p["reality-opts"]
-        }
-        if p.get("spiderX"):
-            entry["spider-x"] = p["spiderX"]
-
-        config["proxies"].append(entry)
+    if providers:
+        config["proxy-providers"] = write_shards(config.pop("proxies"), "grok", OUTPUT_FILE)
+        use_providers(config["proxy-groups"], proxy_names, config["proxy-providers"])
 
     try:
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False, indent=2, default_flow_style=False)
-        print(f"\nConfig saved successfully: {OUTPUT_FILE}")
-        print("Optimized for Iran users → load in mihomo / Clash Meta / FlClash / ...")
+        outputs = {
+            OUTPUT_FILE: render_config(config, safe=True, allow_unicode=True, indent=2, default_flow_style=False)
+        }
+        if singbox:
+            outputs[SINGBOX_FILE] = dump_singbox(nodes)
+        messages = [
+            f"\nConfig saved successfully: {OUTPUT_FILE}",
+            "Optimized for Iran users → load in mihomo / Clash Meta / FlClash / ...",
+        ]
+        if singbox:
+            messages.append(f"sing-box config saved successfully: {SINGBOX_FILE}")
+        publish(outputs, messages=messages)
     except Exception as e:
         print(f"Error saving file: {e}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Inside batch() files are written when the block exits, so errors surface here
+    try:
+        with batch():
+            main(providers="--providers" in sys.argv[1:], singbox="--singbox" in sys.argv[1:])
+    except Exception as e:
+        print(f"Error saving file: {e}")
\ No newline at end of file
@@ -0,0 +1,16 @@
+import hashlib
+
+
+def endpoint_fingerprint(server, port, uuid, proxy_type="vless"):
+    """
+    Stable identity of a node: the endpoint and credentials, not its display name
+    """
+    key = f"{proxy_type}|{server}|{port}|{uuid}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def proxy_fingerprint(proxy):
+    """
+    Endpoint fingerprint of a Clash proxy mapping
+    """
+    return endpoint_fingerprint(proxy["server"], proxy["port"], proxy.get("uuid", ""), proxy.get("type", "vless"))
\ No newline at end of file
@@ -0,0 +1,318 @@
+import hashlib
+import json
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, unquote
+
+from fingerprint import endpoint_fingerprint
+
+# ---------------------------------------------------------
+# Format-neutral node representation
+# ---------------------------------------------------------
+
+@dataclass(frozen=True)
+class Node:
+    name: str
+    server: str
+    port: int
+    uuid: str
+    security: str = ""          # "", "tls" or "reality"
+    sni: str = ""               # as given in the link; renderers fall back to server
+    fp: str = "chrome"          # uTLS client fingerprint
+    public_key: str = ""
+    short_id: str = ""
+    flow: str = ""
+    alpn: Tuple[str, ...] = ()
+    network: str = "tcp"        # "tcp", "ws" or "grpc"
+    header_type: str = ""       # "http" turns tcp into HTTP obfuscation
+    path: str = "/"
+    host: str = ""
+    service_name: str = ""
+    # Hash of everything but the display name; identical nodes share rendered
+    # fragments. Computed once and carried over by renamed().
+    fingerprint: str = field(default="", compare=False, repr=False)
+
+    def __post_init__(self):
+        if not self.fingerprint:
+            key = "|".join(str(getattr(self, f.name)) for f in fields(self) if f.name not in ("name", "fingerprint"))
+            object.__setattr__(self, "fingerprint", hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+
+    @property
+    def endpoint(self) -> str:
+        """
+        Endpoint identity shared with provider sharding and probe history
+        """
+        return endpoint_fingerprint(self.server, self.port, self.uuid)
+
+    def renamed(self, name: str) -> "Node":
+        # Copy the fields directly: dataclasses.replace() would re-run __init__ for every rename
+        node = object.__new__(Node)
+        node.__dict__.update(self.__dict__)
+        object.__setattr__(node, "name", name)
+        return node
+
+
+MEMO_SIZE = 65536  # nodes kept by the parse and fragment memos; bounds long-running `serve --refresh`
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def parse_vless(link: str) -> Optional[Node]:
+    """
+    Parse a vless:// link into a Node, or None if it is not a usable VLESS link
+    """
+    link = link.strip()
+    if not link.startswith("vless://"):
+        return None
+
+    try:
+        parsed = urlparse(link)
+        server = parsed.hostname
+        port = parsed.port
+        uuid_value = parsed.username
+        if not server or not port or not uuid_value:
+            return None
+
+        params = parse_qs(parsed.query)
+
+        def param(key, default=""):
+            return params.get(key, [default])[0]
+
+        path = param("path", "/").split("?")[0] or "/"
+        alpn = param("alpn")
+
+        return Node(
+            name=unquote(parsed.fragment).strip() if parsed.fragment else "",
+            server=server,
+            port=port,
+            uuid=uuid_value,
+            security=param("security"),
+            sni=param("sni"),
+            fp=param("fp", "chrome"),
+            public_key=param("pbk"),
+            short_id=param("sid"),
+            flow=param("flow"),
+            alpn=tuple(alpn.split(",")) if alpn else (),
+            network=param("type", "tcp"),
+            header_type=param("headerType"),
+            path=path,
+            host=param("host"),
+            service_name=param("serviceName"),
+        )
+    except ValueError:
+        return None
+
+
+# ---------------------------------------------------------
+# Renderers (name-less fragments, memoized per node fingerprint)
+# ---------------------------------------------------------
+
+def clash_fragment(node: Node, insecure: bool = False) -> Dict:
+    proxy = {
+        "type": "vless",
+        "server": node.server,
+        "port": node.port,
+        "uuid": node.uuid,
+        "udp": True,
+    }
+    if node.flow:
+        proxy["flow"] = node.flow
+
+    if node.security in ("tls", "reality"):
+        proxy["tls"] = True
+        proxy["servername"] = node.sni or node.server
+        proxy["client-fingerprint"] = "random" if node.fp == "randomized" else node.fp
+        if node.security == "tls":
+            if node.alpn:
+                proxy["alpn"] = list(node.alpn)
+            proxy["skip-cert-verify"] = insecure
+        elif node.public_key:
+            proxy["reality-opts"] = {
+                "public-key": node.public_key,
+                "short-id": node.short_id
+            }
+
+    if node.network == "tcp" and node.header_type == "http":
+        proxy["network"] = "http"
+        proxy["http-opts"] = {
+            "method": "GET",
+            "path": [node.path],
+            "headers": {"Host": [node.host]} if node.host else {}
+        }
+    elif node.network == "ws":
+        proxy["network"] = "ws"
+        proxy["ws-opts"] = {
+            "path": node.path,
+            "headers": {"Host": node.host} if node.host else {}
+        }
+    elif node.network == "grpc":
+        proxy["network"] = "grpc"
+        proxy["grpc-opts"] = {"grpc-service-name": node.service_name}
+    else:
+        proxy["network"] = "tcp"
+
+    return proxy
+
+
+def singbox_fragment(node: Node, insecure: bool = False) -> Optional[Dict]:
+    outbound = {
+        "type": "vless",
+        "server": node.server,
+        "server_port": node.port,
+        "uuid": node.uuid,
+    }
+    if node.flow:
+        outbound["flow"] = node.flow
+
+    if node.security in ("tls", "reality"):
+        tls = {
+            "enabled": True,
+            "server_name": node.sni or node.server,
+            "utls": {"enabled": True, "fingerprint": node.fp},
+        }
+        if node.security == "tls":
+            if node.alpn:
+                tls["alpn"] = list(node.alpn)
+            if insecure:
+                tls["insecure"] = True
+        elif node.public_key:
+            tls["reality"] = {
+                "enabled": True,
+                "public_key": node.public_key,
+                "short_id": node.short_id
+            }
+        outbound["tls"] = tls
+
+    if node.network == "tcp" and node.header_type == "http":
+        # sing-box has no equivalent of V2Ray's TCP HTTP header obfuscation
+        return None
+    elif node.network == "ws":
+        transport = {"type": "ws", "path": node.path}
+        if node.host:
+            transport["headers"] = {"Host": node.host}
+        outbound["transport"] = transport
+    elif node.network == "grpc":
+        outbound["transport"] = {"type": "grpc", "service_name": node.service_name}
+    elif node.network != "tcp":
+        return None
+
+    return outbound
+
+
+RENDERERS = {
+    "clash": ("name", clash_fragment),
+    "singbox": ("tag", singbox_fragment),
+}
+_FRAGMENTS: Dict[Tuple[str, bool, str], Optional[Dict]] = {}
+
+
+def render(node: Node, fmt: str, insecure: bool = False) -> Optional[Dict]:
+    """
+    Render a node for one client format; None if the format cannot express it.
+    insecure skips TLS certificate verification for security=tls nodes.
+    """
+    name_key, renderer = RENDERERS[fmt]
+    key = (fmt, insecure, node.fingerprint)
+    if key not in _FRAGMENTS:
+        if len(_FRAGMENTS) >= MEMO_SIZE:
+            # Evict the oldest entry; hits stay a plain dict lookup
+            del _FRAGMENTS[next(iter(_FRAGMENTS))]
+        _FRAGMENTS[key] = renderer(node, insecure)
+
+    fragment = _FRAGMENTS[key]
+    if fragment is None:
+        return None
+    # Nested mappings are shared between renders: treat them as read-only
+    # (publish.dump_yaml never writes them as YAML aliases)
+    return {name_key: node.name, **fragment}
+
+
+def render_all(nodes: List[Node], fmt: str, insecure: bool = False) -> List[Dict]:
+    return [r for r in (render(n, fmt, insecure) for n in nodes) if r is not None]
+
+
+# ---------------------------------------------------------
+# sing-box profile
+# ---------------------------------------------------------
+
+SINGBOX_RULE_SET_URL = "https://cdn.jsdelivr.net/gh/Chocolate4U/Iran-sing-box-rules@rule-set/{}.srs"
+SINGBOX_RULE_SETS = ["geosite-ir", "geoip-ir", "geosite-ads"]
+
+
+def build_singbox(nodes: List[Node], insecure: bool = False) -> Dict:
+    outbounds = render_all(nodes, "singbox", insecure)
+    tags = [o["tag"] for o in outbounds]
+
+    # sing-box rejects a urltest without outbounds; with no usable node the
+    # profile routes everything direct
+    if tags:
+        groups = [
+            {"type": "selector", "tag": "proxy", "outbounds": ["auto", "direct"] + tags, "default": "auto"},
+            {
+                "type": "urltest",
+                "tag": "auto",
+                "outbounds": tags,
+                "url": "http://www.gstatic.com/generate_204",
+                "interval": "5m",
+                "tolerance": 50
+            },
+        ]
+    else:
+        groups = [{"type": "selector", "tag": "proxy", "outbounds": ["direct"], "default": "direct"}]
+
+    return {
+        "log": {"level": "info"},
+        "dns": {
+            "servers": [
+                {"tag": "remote", "address": "https://1.1.1.1/dns-query", "detour": "proxy"},
+                {"tag": "local", "address": "local", "detour": "direct"}
+            ],
+            "rules": [
+                {"rule_set": ["geosite-ir"], "server": "local"}
+            ],
+            "final": "remote",
+            "strategy": "ipv4_only"
+        },
+        "inbounds": [
+            {
+                "type": "tun",
+                "tag": "tun-in",
+                "address": ["172.19.0.1/30"],
+                "auto_route": True,
+                "strict_route": True,
+                "stack": "mixed"
+            },
+            {"type": "mixed", "tag": "mixed-in", "listen": "127.0.0.1", "listen_port": 7890}
+        ],
+        "outbounds": [
+            *groups,
+            *outbounds,
+            {"type": "direct", "tag": "direct"}
+        ],
+        "route": {
+            "rule_set": [
+                {
+                    "tag": tag,
+                    "type": "remote",
+                    "format": "binary",
+                    "url": SINGBOX_RULE_SET_URL.format(tag),
+                    "download_detour": "direct"
+                }
+                for tag in SINGBOX_RULE_SETS
+            ],
+            "rules": [
+                {"action": "sniff"},
+                {"protocol": "dns", "action": "hijack-dns"},
+                {"ip_is_private": True, "outbound": "direct"},
+                {"rule_set": ["geosite-ads"], "action": "reject"},
+                {"rule_set": ["geosite-ir", "geoip-ir"], "outbound": "direct"},
+                {"domain_suffix": [".ir"], "outbound": "direct"}
+            ],
+            "final": "proxy",
+            "auto_detect_interface": True
+        }
+    }
+
+
+def dump_singbox(nodes: List[Node], insecure: bool = False) -> str:
+    return json.dumps(build_singbox(nodes, insecure), ensure_ascii=False, indent=2)
\ No newline at end of file
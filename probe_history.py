@@ -0,0 +1,276 @@
+import os
+import socket
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fingerprint import proxy_fingerprint
+
+# ---------------------------------------------------------
+# Settings
+# ---------------------------------------------------------
+DB_FILE = os.path.join(".cache", "probe_history.sqlite")
+DEFAULT_CONFIGS = [
+    os.path.join("files", "clash_iran_gemini.yaml"),
+    os.path.join("files", "clash_iran_gpt.yaml"),
+    os.path.join("files", "clash_iran_grok.yaml"),
+]
+
+PROBE_TIMEOUT = 3.0          # seconds per TCP connect
+PROBE_WORKERS = 32
+ALPHA = 0.3                  # EWMA weight of the newest sample
+MIN_PROBES = 3               # below this a node is still "uncertain"
+# Sized for the daily workflow: uncertain nodes are probed on every run,
+# confident ones about every third run. Use shorter TTLs for frequent probes.
+STALE_AFTER = 3 * 86400      # re-probe confident nodes after 3 days
+UNCERTAIN_AFTER = 20 * 3600  # re-probe uncertain nodes after 20h
+RETENTION = 30 * 86400       # forget nodes not probed for 30 days
+FAILURE_PENALTY_MS = 3000.0  # cost added per unit of failure rate when ranking
+MIN_SUCCESS = 0.2            # confidently worse nodes are dropped from generated profiles
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    fingerprint TEXT PRIMARY KEY,
+    server      TEXT NOT NULL,
+    port        INTEGER NOT NULL,
+    probes      INTEGER NOT NULL DEFAULT 0,
+    success     REAL NOT NULL DEFAULT 0,
+    latency     REAL,
+    last_probe  REAL NOT NULL DEFAULT 0,
+    last_ok     REAL
+)
+"""
+
+
+def tcp_probe(server, port, timeout=PROBE_TIMEOUT):
+    """
+    Return the TCP connect latency in milliseconds, or None if unreachable
+    """
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((server, int(port)), timeout=timeout):
+            pass
+    except (OSError, ValueError):
+        return None
+    return (time.perf_counter() - start) * 1000.0
+
+
+class ProbeHistory:
+    """
+    SQLite-backed per-node probe outcomes with EWMA latency and success rate
+    """
+
+    def __init__(self, path=DB_FILE, stale_after=STALE_AFTER, uncertain_after=UNCERTAIN_AFTER):
+        self.stale_after = stale_after
+        self.uncertain_after = uncertain_after
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(SCHEMA)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, fingerprint):
+        return self.conn.execute(
+            "SELECT * FROM probes WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+
+    def record(self, fingerprint, server, port, latency_ms, now=None):
+        """
+        Fold one probe outcome (latency_ms=None means failure) into the averages
+        """
+        now = time.time() if now is None else now
+        ok = latency_ms is not None
+        row = self.get(fingerprint)
+
+        if row is None:
+            success = 1.0 if ok else 0.0
+            latency = latency_ms
+            probes = 1
+        else:
+            success = ALPHA * (1.0 if ok else 0.0) + (1 - ALPHA) * row["success"]
+            latency = row["latency"]
+            if ok:
+                latency = latency_ms if latency is None else ALPHA * latency_ms + (1 - ALPHA) * latency
+            probes = row["probes"] + 1
+
+        self.conn.execute(
+            """
+            INSERT INTO probes (fingerprint, server, port, probes, success, latency, last_probe, last_ok)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(fingerprint) DO UPDATE SET
+                server = excluded.server,
+                port = excluded.port,
+                probes = excluded.probes,
+                success = excluded.success,
+                latency = excluded.latency,
+                last_probe = excluded.last_probe,
+                last_ok = COALESCE(excluded.last_ok, probes.last_ok)
+            """,
+            (fingerprint, server, int(port), probes, success, latency, now, now if ok else None),
+        )
+
+    def needs_probe(self, fingerprint, now=None):
+        """
+        Unknown, stale, or still-uncertain nodes are due for a probe
+        """
+        now = time.time() if now is None else now
+        row = self.get(fingerprint)
+        if row is None:
+            return True
+
+        confident = row["probes"] >= MIN_PROBES and (row["success"] >= 0.8 or row["success"] <= 0.2)
+        ttl = self.stale_after if confident else self.uncertain_after
+        return now - row["last_probe"] >= ttl
+
+    def cost(self, fingerprint):
+        """
+        Expected cost in milliseconds (lower is better); unknown nodes rank last
+        """
+        row = self.get(fingerprint)
+        if row is None or row["latency"] is None:
+            return float("inf")
+        return row["latency"] + (1.0 - row["success"]) * FAILURE_PENALTY_MS
+
+    def is_dead(self, fingerprint):
+        row = self.get(fingerprint)
+        return row is not None and row["probes"] >= MIN_PROBES and row["success"] < MIN_SUCCESS
+
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        self.conn.execute("DELETE FROM probes WHERE last_probe < ?", (now - RETENTION,))
+
+
+# ---------------------------------------------------------
+# Incremental probing and ranking
+# ---------------------------------------------------------
+
+def probe_proxies(proxies, history, workers=PROBE_WORKERS, timeout=PROBE_TIMEOUT):
+    """
+    Probe only the nodes that are due and record the outcomes; returns the number probed
+    """
+    now = time.time()
+    due = {}
+    for p in proxies:
+        fp = proxy_fingerprint(p)
+        if fp not in due and history.needs_probe(fp, now):
+            due[fp] = (p["server"], p["port"])
+
+    if not due:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda item: (item[0], item[1], tcp_probe(*item[1], timeout=timeout)), due.items())
+        for fp, (server, port), latency in results:
+            history.record(fp, server, port, latency, now)
+
+    history.conn.commit()
+    return len(due)
+
+
+def rank_proxies(proxies, history):
+    """
+    Order proxies by historical cost, keeping the input order among equals
+    """
+    return sorted(proxies, key=lambda p: history.cost(proxy_fingerprint(p)))
+
+
+def rank_links(lines, path=DB_FILE):
+    """
+    Order vless:// links by historical cost and drop nodes that keep failing.
+    Generators keep input order, so this orders their select and url-test lists.
+    Without a history database the links are returned unchanged.
+    """
+    if not os.path.exists(path):
+        return list(lines)
+
+    from nodes import parse_vless
+
+    ranked = []
+    dropped = 0
+    with ProbeHistory(path) as history:
+        for index, line in enumerate(lines):
+            node = parse_vless(line)
+            if node is None:
+                continue
+            if history.is_dead(node.endpoint):
+                dropped += 1
+                continue
+            ranked.append((history.cost(node.endpoint), index, line))
+
+    print(f"Ranked {len(ranked)} links from probe history, dropped {dropped} failing nodes.")
+    return [line for _, _, line in sorted(ranked)]
+
+
+def proxies_from_links(lines):
+    from nodes import parse_vless
+
+    proxies = []
+    for line in lines:
+        node = parse_vless(line)
+        if node:
+            proxies.append({
+                "name": node.name or f"{node.server}:{node.port}",
+                "server": node.server,
+                "port": node.port,
+                "uuid": node.uuid,
+            })
+    return proxies
+
+
+def load_proxies(paths):
+    """
+    Proxies of generated profiles, including the ones moved into provider shards
+    """
+    import yaml
+
+    proxies = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Skipping missing config: {path}")
+            continue
+        with open(path, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        proxies.extend(config.get("proxies") or [])
+
+        for provider in (config.get("proxy-providers") or {}).values():
+            shard = os.path.join(os.path.dirname(path), "providers", os.path.basename(provider.get("url", "")))
+            if not os.path.isfile(shard):
+                print(f"Skipping missing provider shard: {shard}")
+                continue
+            with open(shard, encoding="utf-8") as f:
+                proxies.extend((yaml.safe_load(f) or {}).get("proxies") or [])
+    return proxies
+
+
+def main(paths=None, top=20, links=None, stale_after=STALE_AFTER, uncertain_after=UNCERTAIN_AFTER):
+    proxies = proxies_from_links(links) if links is not None else load_proxies(paths or DEFAULT_CONFIGS)
+    if not proxies:
+        print("[ERROR] No proxies to probe.")
+        return 1
+
+    with ProbeHistory(stale_after=stale_after, uncertain_after=uncertain_after) as history:
+        history.prune()
+        probed = probe_proxies(proxies, history)
+        print(f"Probed {probed} of {len(proxies)} proxies (the rest ranked from history).")
+
+        for p in rank_proxies(proxies, history)[:top]:
+            row = history.get(proxy_fingerprint(p))
+            latency = f"{row['latency']:.0f} ms" if row and row["latency"] is not None else "n/a"
+            success = f"{row['success'] * 100:.0f}%" if row else "n/a"
+            print(f"{latency:>8}  {success:>4}  {p['name']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
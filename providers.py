@@ -0,0 +1,104 @@
+import hashlib
+import os
+import re
+
+from fingerprint import proxy_fingerprint
+from publish import dump_yaml, publish
+
+# ---------------------------------------------------------
+# Settings
+# ---------------------------------------------------------
+PROVIDERS_DIR = os.path.join("files", "providers")
+PROVIDERS_BASE_URL = "https://raw.githubusercontent.com/x45fh56/server_clash/refs/heads/main/files/providers"
+SHARD_COUNT = 8
+PROVIDER_INTERVAL = 3600
+
+
+def shard_index(proxy, shard_count=SHARD_COUNT):
+    """
+    Nodes land in a shard by endpoint, so one node change only touches one shard
+    """
+    return int(proxy_fingerprint(proxy), 16) % shard_count
+
+
+def referenced_shards(profile, prefix):
+    """
+    Shard filenames named in a published profile; missing profile -> none
+    """
+    if not profile or not os.path.exists(profile):
+        return set()
+    with open(profile, encoding="utf-8") as f:
+        text = f.read()
+    return set(re.findall(rf"providers/({re.escape(prefix)}-\d+-[0-9a-f]+\.yaml)", text))
+
+
+def write_shards(proxies, prefix, profile=None, shard_count=SHARD_COUNT):
+    """
+    Publish proxies as content-hashed shard files and return the matching
+    `proxy-providers` mapping. Shards still referenced by the previously
+    published `profile` are kept, since clients and CDN caches may hold that
+    profile for a while; older shards are removed.
+
+    Shards keep the input order of their proxies, and providers are listed by
+    the position of their first proxy. Clients show provider nodes shard by
+    shard, so a ranked input only survives within each shard and in the
+    order of the shards' best nodes.
+    """
+    os.makedirs(PROVIDERS_DIR, exist_ok=True)
+
+    buckets = [[] for _ in range(shard_count)]
+    first = {}
+    for position, p in enumerate(proxies):
+        index = shard_index(p, shard_count)
+        first.setdefault(index, position)
+        buckets[index].append(p)
+
+    providers = {}
+    files = {}
+    current = set()
+    for index in sorted(first, key=first.get):  # by each shard's first proxy
+        bucket = buckets[index]
+        text = dump_yaml({"proxies": bucket}, safe=True, allow_unicode=True, sort_keys=False)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        name = f"{prefix}-{index:02d}"
+        filename = f"{name}-{digest}.yaml"
+        current.add(filename)
+
+        path = os.path.join(PROVIDERS_DIR, filename)
+        if not os.path.exists(path):
+            files[path] = text
+
+        providers[name] = {
+            "type": "http",
+            "url": f"{PROVIDERS_BASE_URL}/{filename}",
+            "path": f"./providers/{filename}",
+            "interval": PROVIDER_INTERVAL,
+        }
+
+    keep = current | referenced_shards(profile, prefix)
+    stale = [
+        os.path.join(PROVIDERS_DIR, filename)
+        for filename in os.listdir(PROVIDERS_DIR)
+        if filename.startswith(f"{prefix}-") and filename not in keep
+    ]
+    publish(files, remove=stale)
+    return providers
+
+
+def use_providers(proxy_groups, proxy_names, providers):
+    """
+    Replace inlined node names in proxy groups with `use:` of the providers
+    """
+    names = set(proxy_names)
+    for group in proxy_groups:
+        members = group.get("proxies", [])
+        if not any(m in names for m in members):
+            continue
+
+        kept = [m for m in members if m not in names]
+        if kept:
+            group["proxies"] = kept
+        else:
+            group.pop("proxies")
+        group["use"] = list(providers)
+    return proxy_groups
\ No newline at end of file
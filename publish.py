@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+import yaml
+
+# ---------------------------------------------------------
+# Settings
+# ---------------------------------------------------------
+FRAGMENT_CACHE_DIR = os.path.join(".cache", "fragments")
+MANIFEST_FILE = os.path.join("files", "manifest.json")
+DYNAMIC_KEYS = ("proxies", "proxy-groups", "proxy-providers")
+
+_fragments = {}      # digest -> rendered YAML, for repeated runs in one process
+_pending = None      # deferred outputs, removals and messages while a batch() is open
+
+
+class NoAliasDumper(yaml.Dumper):
+    """
+    Rendered proxies share nested mappings through the fragment memo in nodes.py;
+    write them out in full instead of as YAML anchors and aliases
+    """
+
+    def ignore_aliases(self, data):
+        return True
+
+
+class NoAliasSafeDumper(yaml.SafeDumper):
+    def ignore_aliases(self, data):
+        return True
+
+
+def dump_yaml(data, safe=False, **options):
+    return yaml.dump(data, Dumper=NoAliasSafeDumper if safe else NoAliasDumper, **options)
+
+
+# ---------------------------------------------------------
+# Static fragment cache
+# ---------------------------------------------------------
+
+def render_fragment(entries, safe=False, **options):
+    """
+    YAML text of a run of top-level entries, cached by a hash of their source dicts
+    and the PyYAML version that rendered them
+    """
+    source = json.dumps(
+        [yaml.__version__, "safe_dump" if safe else "dump", options, list(entries.items())],
+        ensure_ascii=False,
+        default=str,
+    )
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()[:24]
+    if digest in _fragments:
+        return _fragments[digest]
+
+    path = os.path.join(FRAGMENT_CACHE_DIR, f"{digest}.yaml")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8", newline="") as f:
+            text = f.read()
+    else:
+        text = dump_yaml(entries, safe, **options)
+        atomic_write(path, text)
+
+    _fragments[digest] = text
+    return text
+
+
+def render_config(config, dynamic_keys=DYNAMIC_KEYS, safe=False, **options):
+    """
+    Dump a config mapping in key order, reusing cached text for everything but
+    the per-run keys. Same output as yaml.dump / yaml.safe_dump(config, sort_keys=False, ...).
+    """
+    options["sort_keys"] = False
+    parts = []
+    run = {}
+    for key, value in config.items():
+        if key not in dynamic_keys:
+            run[key] = value
+            continue
+        if run:
+            parts.append(render_fragment(run, safe, **options))
+            run = {}
+        parts.append(dump_yaml({key: value}, safe, **options))
+    if run:
+        parts.append(render_fragment(run, safe, **options))
+    return "".join(parts)
+
+
+# ---------------------------------------------------------
+# Atomic publish
+# ---------------------------------------------------------
+
+def _stage(path, text):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600 files
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return tmp
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return  # e.g. Windows cannot open directories
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, text):
+    """
+    Readers see either the old file or the complete new one, never a truncated one
+    """
+    os.replace(_stage(path, text), path)
+    _fsync_dir(os.path.dirname(path))
+
+
+def _publish(outputs, remove):
+    staged = []
+    try:
+        for path, text in outputs.items():
+            staged.append((_stage(path, text), path))
+    except BaseException:
+        for tmp, _ in staged:
+            os.remove(tmp)
+        raise
+
+    for tmp, path in staged:
+        os.replace(tmp, path)
+    for path in remove:
+        if os.path.exists(path):
+            os.remove(path)
+    for directory in {os.path.dirname(p) for p in list(outputs) + list(remove)}:
+        _fsync_dir(directory)
+
+    update_manifest(outputs, remove)
+
+
+def update_manifest(outputs, remove=()):
+    """
+    Record sha256 and size of every published file; written last so it never
+    describes files that are not in place yet
+    """
+    base = os.path.dirname(MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    for path in remove:
+        manifest.pop(os.path.relpath(path, base).replace(os.sep, "/"), None)
+    for path, text in outputs.items():
+        data = text.encode("utf-8")
+        manifest[os.path.relpath(path, base).replace(os.sep, "/")] = {
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "size": len(data),
+        }
+
+    atomic_write(MANIFEST_FILE, json.dumps(dict(sorted(manifest.items())), indent=2) + "\n")
+
+
+def publish(outputs, remove=(), messages=()):
+    """
+    Publish {path: text} and delete `remove`. Each file is replaced atomically
+    and the manifest is written last; the set as a whole is not atomic.
+    `messages` are printed once the files are in place. Inside batch() all of
+    this is deferred to the end of the block, so write errors surface there.
+    """
+    if _pending is not None:
+        _pending[0].update(outputs)
+        _pending[1].extend(remove)
+        _pending[2].extend(messages)
+        return
+    _publish(outputs, list(remove))
+    for message in messages:
+        print(message)
+
+
+@contextmanager
+def batch():
+    """
+    Collect everything published inside the block and publish it on exit; nests
+    """
+    global _pending
+    if _pending is not None:
+        yield
+        return
+
+    _pending = ({}, [], [])
+    try:
+        yield
+        outputs, remove, messages = _pending
+    finally:
+        _pending = None
+    if outputs or remove:
+        _publish(outputs, remove)
+    for message in messages:
+        print(message)
\ No newline at end of file
@@ -0,0 +1,3 @@
+"""
+Unified entry point for the Clash config generators: python -m server_clash
+"""
\ No newline at end of file
@@ -0,0 +1,6 @@
+import sys
+
+from server_clash.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
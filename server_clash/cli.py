@@ -0,0 +1,206 @@
+import argparse
+import importlib
+import os
+
+# Heavy modules (yaml, requests, urllib.request, sqlite3, the generators) are
+# imported inside the subcommands that need them so startup stays cheap.
+
+GENERATORS = {
+    "gemini": "app_iran_gemini",
+    "gpt": "app_iran_gpt",
+    "grok": "app_iran_grok",
+}
+SOURCE_URL = "https://raw.githubusercontent.com/x45fh56/tgs/refs/heads/main/Servers/Protocols/Categorized_Servers/1_VLESS_REALITY_TCP.txt"
+SOURCE_CACHE = os.path.join(".cache", "source.txt")
+DEDUPED_CACHE = os.path.join(".cache", "deduped.txt")
+
+
+def fetch_lines(url, timeout=15):
+    import urllib.request
+
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode("utf-8").splitlines()
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def save_lines(path, lines):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def generate(names, providers=False, input_path=None, singbox=False, dedupe=False, max_memory=None, rank=False):
+    """
+    Run the selected generators in one process, downloading each source only once.
+    Parsed nodes and rendered proxies are memoized, so later generators reuse them.
+    With dedupe, repeated nodes are dropped first; local inputs larger than
+    max_memory are deduplicated on disk. The ceiling covers that pass only:
+    the survivors are read back into memory, since every generator needs all
+    node names for its proxy groups. With rank, links are ordered by probe
+    history and failing nodes dropped; with providers too, that order only
+    holds within each shard (see providers.write_shards). All outputs are
+    published together.
+    """
+    from publish import batch
+
+    if rank and providers:
+        print("[WARNING] With --providers, nodes are listed shard by shard: --rank orders shards by their best node and nodes within each shard only.")
+
+    modules = [importlib.import_module(GENERATORS[name]) for name in names]
+    sources = {}
+
+    if input_path:
+        if dedupe:
+            from dedupe import DEFAULT_MAX_MEMORY, dedupe_file
+
+            kept = dedupe_file(input_path, DEDUPED_CACHE, max_memory or DEFAULT_MAX_MEMORY)
+            print(f"Kept {kept} distinct nodes from: {input_path}")
+            input_path = DEDUPED_CACHE
+
+        print(f"Reading links from: {input_path}")
+        lines = read_lines(input_path)
+        if rank:
+            from probe_history import rank_links
+
+            lines = rank_links(lines)
+        for module in modules:
+            sources[module.SOURCE_URL] = lines
+
+    with batch():
+        for module in modules:
+            if module.SOURCE_URL not in sources:
+                print(f"Downloading links from: {module.SOURCE_URL}")
+                sources[module.SOURCE_URL] = fetch_lines(module.SOURCE_URL)
+                if dedupe:
+                    from dedupe import dedupe_in_memory
+
+                    sources[module.SOURCE_URL] = list(dedupe_in_memory(sources[module.SOURCE_URL]))
+                if rank:
+                    from probe_history import rank_links
+
+                    sources[module.SOURCE_URL] = rank_links(sources[module.SOURCE_URL])
+            module.main(providers, sources[module.SOURCE_URL], singbox)
+
+
+def cmd_generate(args):
+    unknown = [name for name in args.names if name not in GENERATORS]
+    if unknown:
+        print(f"[ERROR] Unknown generator(s): {', '.join(unknown)} (choose from {', '.join(GENERATORS)})")
+        return 2
+
+    try:
+        max_memory = args.max_memory * 1024 * 1024 if args.max_memory else None
+        generate(args.names or list(GENERATORS), args.providers, args.input, args.singbox, args.dedupe, max_memory, args.rank)
+    except OSError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    return 0
+
+
+def cmd_fetch(args):
+    try:
+        lines = fetch_lines(args.url)
+    except OSError as e:
+        print(f"Failed to download: {e}")
+        return 1
+
+    save_lines(args.output, lines)
+    print(f"Saved {len(lines)} links to {args.output}")
+    return 0
+
+
+def cmd_probe(args):
+    import probe_history
+
+    links = read_lines(args.input) if args.input else None
+    ttls = {}
+    if args.stale_after is not None:
+        ttls["stale_after"] = args.stale_after * 3600
+    if args.uncertain_after is not None:
+        ttls["uncertain_after"] = args.uncertain_after * 3600
+    return probe_history.main(args.configs, top=args.top, links=links, **ttls)
+
+
+def cmd_serve(args):
+    import functools
+    import http.server
+    import threading
+    import time
+
+    if args.refresh:
+        def refresh():
+            while True:
+                time.sleep(args.refresh)
+                try:
+                    if args.rank:
+                        import probe_history
+
+                        # Probe the due nodes of the current list, then generate from the same list
+                        lines = fetch_lines(SOURCE_URL)
+                        save_lines(SOURCE_CACHE, lines)
+                        probe_history.main(top=0, links=lines)
+                        generate(list(GENERATORS), args.providers, SOURCE_CACHE, args.singbox, rank=True)
+                    else:
+                        generate(list(GENERATORS), args.providers, singbox=args.singbox)
+                except Exception as e:
+                    print(f"[ERROR] Refresh failed: {e}")
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=args.directory)
+    with http.server.ThreadingHTTPServer((args.host, args.port), handler) as httpd:
+        print(f"Serving {args.directory} on http://{args.host}:{args.port}")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m server_clash")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("generate", help="build Clash (and optionally sing-box) profiles")
+    p.add_argument("names", nargs="*", help="gemini, gpt and/or grok (default: all)")
+    p.add_argument("--providers", action="store_true", help="write nodes as sharded proxy-providers")
+    p.add_argument("--input", help="read links from a local file instead of downloading")
+    p.add_argument("--singbox", action="store_true", help="also write sing-box JSON profiles")
+    p.add_argument("--dedupe", action="store_true", help="drop repeated nodes before generating")
+    p.add_argument("--max-memory", type=int, metavar="MB", help="RAM ceiling of the --dedupe pass before it spills to disk (default: 256); generating still holds all distinct nodes")
+    p.add_argument("--rank", action="store_true", help="order nodes by probe history and drop failing ones (per shard with --providers)")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("fetch", help="download the source link list")
+    p.add_argument("--url", default=SOURCE_URL)
+    p.add_argument("--output", default=SOURCE_CACHE)
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser("probe", help="incrementally probe nodes and rank them from history")
+    p.add_argument("configs", nargs="*", help="generated profiles to read nodes from")
+    p.add_argument("--input", help="probe the links in a local file instead of generated profiles")
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--stale-after", type=float, metavar="HOURS", help="re-probe confident nodes after this long (default: 72)")
+    p.add_argument("--uncertain-after", type=float, metavar="HOURS", help="re-probe uncertain nodes after this long (default: 20)")
+    p.set_defaults(func=cmd_probe)
+
+    p = sub.add_parser("serve", help="serve generated files over HTTP")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--directory", default="files")
+    p.add_argument("--refresh", type=int, default=0, help="regenerate every N seconds (0 = never)")
+    p.add_argument("--providers", action="store_true")
+    p.add_argument("--singbox", action="store_true")
+    p.add_argument("--rank", action="store_true", help="probe the source on each refresh and generate ranked profiles")
+    p.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
\ No newline at end of file